@@ -1,21 +1,56 @@
 # app.py
 
+import io
 import os
-from flask import Flask, render_template, redirect, url_for, flash, request
+import hashlib
+import sqlite3
+import threading
+from flask import Flask, render_template, redirect, url_for, flash, request, make_response, send_file, abort
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import make_transient_to_detached
 from flask_migrate import Migrate
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError
-from werkzeug.security import generate_password_hash, check_password_hash
-import requests
+from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Regexp
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHash
+from cachetools import TTLCache
+from stock_data import TICKER_RE, normalize_ticker, get_stock_data, get_stocks_data
+from stock_graph import create_stock_graph
 
 # Configuration
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///stock_portfolio.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['ALPHA_VANTAGE_API_KEY'] = os.environ.get('ALPHA_VANTAGE_API_KEY')
+# CSRF tokens stay valid for the life of the session instead of being
+# re-timestamped and checked against a one-hour window.
+app.config['WTF_CSRF_TIME_LIMIT'] = None
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # SQLite has no server-side pool to size; just allow connections to be
+    # shared across the threads/greenlets serving requests.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'check_same_thread': False}}
+else:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL lets readers proceed while a write is in progress.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
 
 # Extensions
 db = SQLAlchemy(app)
@@ -24,19 +59,40 @@ login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
 # Logging setup
+import atexit
+import queue
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 if not app.debug:
     if not os.path.exists('logs'):
         os.mkdir('logs')
+    log_level = getattr(logging, (os.environ.get('LOG_LEVEL') or 'INFO').upper(), None)
+    if not isinstance(log_level, int):
+        log_level = logging.INFO
+    log_format = '%(asctime)s %(levelname)s: %(message)s'
+    if log_level <= logging.DEBUG:
+        log_format += ' [in %(pathname)s:%(lineno)d]'
     file_handler = RotatingFileHandler('logs/portfolio_tracker.log', maxBytes=10240, backupCount=10)
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
+    file_handler.setFormatter(logging.Formatter(log_format))
+    file_handler.setLevel(log_level)
+    # QueueHandler still renders the message (and any traceback) on the
+    # calling thread; the file writes and rotation happen on the listener's.
+    log_queue = queue.Queue(-1)
+    log_listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    app.logger.addHandler(QueueHandler(log_queue))
+    app.logger.setLevel(log_level)
     app.logger.info('Portfolio Tracker startup')
 
+password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2)
+
+# Per-worker cache of the user columns templates need, so most authenticated
+# requests skip the primary-key SELECT in load_user. Entries expire after a
+# minute, which bounds how long other workers can see a stale username/email.
+_user_cache = TTLCache(maxsize=10000, ttl=60)
+_user_cache_lock = threading.Lock()
+
 # Models
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -45,14 +101,64 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128))
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
+        with _user_cache_lock:
+            _user_cache.pop(self.id, None)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not self.password_hash.startswith('$argon2'):
+            # Legacy werkzeug pbkdf2 hash: verify it once, then upgrade to argon2.
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        try:
+            password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHash):
+            return False
+        if password_hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
+
+    @property
+    def session_version(self):
+        # Changes whenever the password hash does, so sessions and remember-me
+        # cookies issued before a password change stop loading the user.
+        return hashlib.sha256(self.password_hash.encode('utf8')).hexdigest()[:16]
+
+    def get_id(self):
+        return f'{self.id}:{self.session_version}'
+
+class Stock(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    ticker = db.Column(db.String(10), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user = db.relationship('User', backref='stocks')
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id, _, session_version = user_id.partition(':')
+    user_id = int(user_id)
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+    if cached is None or cached['session_version'] != session_version:
+        # Cache miss, or the cookie has a different version than the cached
+        # entry: only the database can say which one is current.
+        user = db.session.get(User, user_id)
+        if user is None or user.session_version != session_version:
+            with _user_cache_lock:
+                _user_cache.pop(user_id, None)
+            return None
+        with _user_cache_lock:
+            _user_cache[user_id] = {'id': user.id, 'username': user.username,
+                                    'email': user.email, 'session_version': user.session_version}
+        return user
+    # Rebuild a detached instance from the cached columns and merge it into
+    # this request's session without a SELECT. merge() returns the instance the
+    # session already holds for this id, if any; unlisted columns load lazily.
+    user = User(id=cached['id'], username=cached['username'], email=cached['email'])
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 # Forms
 class LoginForm(FlaskForm):
@@ -69,24 +175,19 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Register')
 
     def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user is not None:
+        taken = db.session.query(db.exists().where(User.username == username.data)).scalar()
+        if taken:
             raise ValidationError('Please use a different username.')
 
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is not None:
+        taken = db.session.query(db.exists().where(User.email == email.data)).scalar()
+        if taken:
             raise ValidationError('Please use a different email address.')
 
-# Stock Data Functionality
-def get_stock_data(ticker):
-    try:
-        response = requests.get(f'https://api.example.com/stocks/{ticker}')
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        app.logger.error(f"Error fetching data for ticker {ticker}: {e}")
-        return None
+class StockForm(FlaskForm):
+    symbol = StringField('Symbol', filters=[lambda s: normalize_ticker(s) if s else s],
+                         validators=[DataRequired(), Regexp(TICKER_RE, message='Please enter a valid ticker symbol.')])
+    submit = SubmitField('Add Stock')
 
 # Routes
 @app.route('/')
@@ -102,6 +203,8 @@ def login():
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password')
             return redirect(url_for('login'))
+        # Persist the hash if check_password upgraded it.
+        db.session.commit()
         login_user(user, remember=form.remember_me.data)
         return redirect(url_for('index'))
     return render_template('login.html', title='Sign In', form=form)
@@ -126,19 +229,54 @@ def register():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html', title='Dashboard')
+    preferred_stocks = [stock.ticker for stock in current_user.stocks]
+    stock_data = get_stocks_data(preferred_stocks)
+
+    # The page only changes when the user's tickers or one of their latest
+    # trading days change, so let the browser revalidate instead of
+    # re-downloading it. Failed fetches hash as None so recovering changes it.
+    ticker_state = tuple((ticker, max(data) if data else None)
+                         for ticker, data in sorted(stock_data.items()))
+    etag_source = repr((current_user.id, ticker_state))
+    etag = hashlib.sha1(etag_source.encode('utf8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template('dashboard.html', title='Dashboard', stocks=stock_data))
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
+@app.route('/graph/<ticker>.png')
+@login_required
+def stock_graph(ticker):
+    time_series = get_stock_data(ticker)
+    if not time_series:
+        abort(404)
+    png = create_stock_graph(ticker, time_series)
+    # Served separately from the HTML so the browser can cache it. The
+    # dashboard versions the URL with the latest trading date (d=); only a URL
+    # whose date matches the series rendered here is safe to mark immutable.
+    response = send_file(io.BytesIO(png), mimetype='image/png')
+    if request.args.get('d') == max(time_series):
+        response.headers['Cache-Control'] = 'private, max-age=3600, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/add_stock', methods=['GET', 'POST'])
 @login_required
 def add_stock():
-    if request.method == 'POST':
-        ticker = request.form['ticker']
-        stock_data = get_stock_data(ticker)
-        if stock_data:
+    form = StockForm()
+    if form.validate_on_submit():
+        ticker = form.symbol.data
+        if get_stock_data(ticker):
+            db.session.add(Stock(ticker=ticker, user_id=current_user.id))
+            db.session.commit()
             flash(f'Successfully added {ticker} to your portfolio!')
-        else:
-            flash(f'Failed to retrieve data for {ticker}.')
-    return render_template('add_stock.html', title='Add Stock')
+            return redirect(url_for('dashboard'))
+        flash(f'Failed to retrieve data for {ticker}.')
+    return render_template('add_stock.html', title='Add Stock', form=form)
 
 # WSGI entry point
 if __name__ == '__main__':
@@ -4,7 +4,8 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, ValidationError, Email, EqualTo
-from models import User
+from Portfolio_Tracker import db
+from Portfolio_Tracker.models import User
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -21,11 +22,11 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Register')
 
     def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user is not None:
+        taken = db.session.query(db.exists().where(User.username == username.data)).scalar()
+        if taken:
             raise ValidationError('Please use a different username.')
 
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is not None:
+        taken = db.session.query(db.exists().where(User.email == email.data)).scalar()
+        if taken:
             raise ValidationError('Please use a different email address.')
@@ -0,0 +1,12 @@
+# File: Portfolio_Tracker/gunicorn.conf.py
+# Description: Gunicorn settings for serving the application with gevent workers.
+
+import multiprocessing
+
+wsgi_app = 'wsgi:application'
+worker_class = 'gevent'
+# The usual 2 x CPU + 1 rule of thumb for worker processes.
+workers = multiprocessing.cpu_count() * 2 + 1
+# Each connection is a greenlet; keep this well above the number of tickers
+# a single dashboard request fans out to.
+worker_connections = 1000
@@ -1,22 +1,97 @@
 # File: Portfolio_Tracker/stock_data.py
 # Description: Module for fetching stock data from external APIs.
 
+import os
+import re
+import json
+import redis
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 
+# Daily series only change once per trading day, so an hour is plenty.
+STOCK_CACHE_TTL = 3600
+
+# Short socket timeouts so a hung Redis degrades to a cache miss instead of
+# blocking the request.
+rcache = redis.Redis.from_url(os.environ.get('REDIS_URL') or 'redis://localhost:6379/0',
+                              socket_connect_timeout=0.25, socket_timeout=0.5)
+
+# Upper bound on concurrent fetches for a single dashboard request.
+MAX_FETCH_WORKERS = 8
+
+# Reuse TCP/TLS connections to Alpha Vantage across requests and tickers.
+_http = requests.Session()
+_http.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                    max_retries=Retry(total=2, backoff_factor=0.2)))
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+
+TICKER_RE = re.compile(r'^[A-Z.\-]{1,10}$')
+
+# (connect, read) timeouts so a hung upstream can't tie up a worker forever.
+HTTP_TIMEOUT = (3, 10)
+
+def normalize_ticker(ticker):
+    return ticker.strip().upper()
+
 def get_stock_data(ticker):
-    api_key = current_app.config['ALPHA_VANTAGE_API_KEY']
-    base_url = 'https://www.alphavantage.co/query?'
-    function = 'TIME_SERIES_DAILY'
-    url = f'{base_url}function={function}&symbol={ticker}&apikey={api_key}'
-    response = requests.get(url)
-    data = response.json()
-    
+    ticker = normalize_ticker(ticker)
+    # Anything that isn't a plausible symbol would only waste an API call and
+    # a cache entry.
+    if not TICKER_RE.match(ticker):
+        return None
+    cache_key = f'av:daily:{ticker}'
+    try:
+        cached = rcache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Redis unavailable, skipping cache for {ticker}: {e}")
+
+    params = {
+        'function': 'TIME_SERIES_DAILY',
+        'symbol': ticker,
+        'apikey': current_app.config['ALPHA_VANTAGE_API_KEY'],
+    }
+    try:
+        response = _http.get(ALPHA_VANTAGE_URL, params=params, timeout=HTTP_TIMEOUT)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        current_app.logger.error(f"Error fetching data for ticker {ticker}: {e}")
+        return None
+
     if 'Error Message' in data:
         return None
-    
+
     time_series = data.get('Time Series (Daily)')
     if not time_series:
         return None
-    
+
+    try:
+        rcache.setex(cache_key, STOCK_CACHE_TTL, json.dumps(time_series))
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Redis unavailable, could not cache {ticker}: {e}")
+
     return time_series
+
+def _get_stock_data_in_context(app, ticker):
+    with app.app_context():
+        return get_stock_data(ticker)
+
+def get_stocks_data(tickers):
+    # Each ticker once, so duplicates share a single fetch.
+    tickers = list(dict.fromkeys(map(normalize_ticker, tickers)))
+    if not tickers:
+        return {}
+    app = current_app._get_current_object()
+    # Fetches are I/O-bound, so running them concurrently makes the dashboard
+    # wait on the slowest ticker instead of the sum of all of them. The pool is
+    # per call (threads are greenlets under gevent), so one slow ticker never
+    # holds up other users' requests.
+    with ThreadPoolExecutor(max_workers=min(len(tickers), MAX_FETCH_WORKERS)) as pool:
+        futures = {ticker: pool.submit(_get_stock_data_in_context, app, ticker)
+                   for ticker in tickers}
+        return {ticker: future.result() for ticker, future in futures.items()}
@@ -0,0 +1,64 @@
+# File: Portfolio_Tracker/stock_graph.py
+# Description: Render stock price graphs as PNG images.
+
+import io
+import threading
+import redis
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from flask import current_app
+from stock_data import rcache, normalize_ticker
+
+# One Figure per process, reused by clearing the axes between renders instead
+# of building a new figure every time. Figures are not thread-safe, so renders
+# are serialized with a lock (a greenlet-aware one under gevent's patching).
+_figure = Figure(figsize=(10, 5))
+_canvas = FigureCanvasAgg(_figure)
+_ax = _figure.subplots()
+_render_lock = threading.Lock()
+
+MARKER_MAX_POINTS = 100
+# The graph is shown at a small size, so 72 dpi is enough and keeps the PNG
+# well below matplotlib's default 100 dpi output.
+GRAPH_DPI = 72
+
+GRAPH_CACHE_TTL = 86400
+
+def create_stock_graph(ticker, time_series):
+    ticker = normalize_ticker(ticker)
+    # Keying on the latest trading date means a new data point gets a new key,
+    # so stale graphs never need to be invalidated explicitly.
+    cache_key = f'graph:png:{ticker}:{max(time_series)}'
+    try:
+        cached = rcache.get(cache_key)
+        if cached is not None:
+            return cached
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Redis unavailable, skipping graph cache for {ticker}: {e}")
+
+    items = sorted(time_series.items())
+    dates = np.array([date for date, _ in items], dtype='datetime64[D]')
+    close_prices = np.fromiter((float(values['4. close']) for _, values in items),
+                               dtype=np.float64, count=len(items))
+
+    # Per-point markers are costly to draw and unreadable on long series.
+    marker = 'o' if len(items) <= MARKER_MAX_POINTS else None
+    img = io.BytesIO()
+    with _render_lock:
+        _ax.clear()
+        _ax.plot(dates, close_prices, marker=marker)
+        _ax.set_title(f'{ticker} Closing Prices')
+        _ax.set_xlabel('Date')
+        _ax.set_ylabel('Close Price')
+        _canvas.print_figure(img, format='png', dpi=GRAPH_DPI)
+    png = img.getvalue()
+
+    try:
+        rcache.setex(cache_key, GRAPH_CACHE_TTL, png)
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Redis unavailable, could not cache graph for {ticker}: {e}")
+
+    return png
@@ -1,6 +1,8 @@
 # Portfolio_Tracker/wsgi.py
 
+# Patch the standard library before anything imports socket/ssl, so requests
+# calls to Alpha Vantage yield to other greenlets instead of blocking the worker.
+from gevent import monkey
+monkey.patch_all()
 
-from Portfolio_Tracker.app import create_app
-
-app = create_app()
+from app import app as application